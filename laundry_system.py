@@ -4,18 +4,102 @@ import sqlite3
 import re
 import datetime
 import os
+import sys
+import json
+import hashlib
 import time
+import asyncio
+import random
+import threading
+import smtplib
+import ssl
+import tempfile
+from email.message import EmailMessage
+import subprocess
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 # ---------------- DATABASE SETUP ----------------
-def initialize_db():
+DB_PATH = "laundry.db"
+DB_BUSY_TIMEOUT = 10     # seconds to wait for another terminal's write lock
+DB_UI_BUSY_TIMEOUT = 0.25  # shorter wait for writes made from the Tk thread, so a held lock can't freeze the window
+DB_RETRY_ATTEMPTS = 5    # retries when the lock is still held after the busy timeout
+
+class StaleAssignmentError(Exception):
+    # Raised when an assignment row changed since it was loaded, e.g. on another terminal
+    pass
+
+def connect_db(db_path=DB_PATH, timeout=DB_BUSY_TIMEOUT, **kwargs):
+    return sqlite3.connect(db_path, timeout=timeout, **kwargs)
+
+def run_with_retry(operation, *args):
+    # The operation must roll back its own transaction before raising
+    for attempt in range(DB_RETRY_ATTEMPTS):
+        try:
+            return operation(*args)
+        except sqlite3.OperationalError as e:
+            busy = 'locked' in str(e) or 'busy' in str(e)
+            if not busy or attempt == DB_RETRY_ATTEMPTS - 1:
+                raise
+            time.sleep(random.uniform(0, 0.05 * 2 ** attempt))  # Jitter so terminals don't retry in lockstep
+
+@contextmanager
+def write_transaction(db_path=DB_PATH, conn=None):
+    # BEGIN IMMEDIATE takes the write lock up front, so reads inside the transaction can't go stale.
+    # Pass conn to write through a connection the caller keeps open.
+    own_conn = conn is None
+    if own_conn:
+        conn = connect_db(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn.cursor()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+NETWORK_FILESYSTEMS = ('nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', '9p', 'afs', 'ceph', 'glusterfs', 'fuse.sshfs')
+
+def is_network_path(path):
+    path = os.path.abspath(path)
+    if sys.platform == "win32":
+        if path.startswith("\\\\"):
+            return True  # UNC path such as \\server\share\laundry.db
+        import ctypes
+        DRIVE_REMOTE = 4  # Mapped network drive
+        return ctypes.windll.kernel32.GetDriveTypeW(os.path.splitdrive(path)[0] + "\\") == DRIVE_REMOTE
+
+    # Linux: find the filesystem type of the longest mount point containing the path
+    try:
+        with open("/proc/mounts") as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return False
+    best_mount, fs_type = "", ""
+    for mount_point, mount_type in mounts:
+        inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) > len(best_mount):
+            best_mount, fs_type = mount_point, mount_type
+    return fs_type in NETWORK_FILESYSTEMS
+
+def initialize_db(db_path=DB_PATH):
     # Force reset database to ensure correct schema
     # Comment out after first run if you want to keep data
     # if os.path.exists("laundry.db"):
     #     os.remove("laundry.db")
 
-    conn = sqlite3.connect("laundry.db")
+    conn = connect_db(db_path)
     cursor = conn.cursor()
 
+    # WAL lets counter terminals keep reading while another one writes, but it relies on shared
+    # memory that network shares don't provide, so a database on a share keeps the rollback journal
+    if is_network_path(db_path):
+        cursor.execute("PRAGMA journal_mode=DELETE;")
+    else:
+        cursor.execute("PRAGMA journal_mode=WAL;")
     cursor.execute("PRAGMA foreign_keys=off;")
 
     cursor.execute("""
@@ -70,6 +154,8 @@ def initialize_db():
             start_time DATETIME,
             status TEXT DEFAULT 'In Progress',
             timer_minutes INTEGER DEFAULT 0,
+            timer_ends_at REAL,
+            version INTEGER NOT NULL DEFAULT 0,
             FOREIGN KEY (username) REFERENCES users(username)
         )
     """)
@@ -82,10 +168,52 @@ def initialize_db():
             start_time DATETIME,
             status TEXT DEFAULT 'In Progress',
             timer_minutes INTEGER DEFAULT 0,
+            timer_ends_at REAL,
+            version INTEGER NOT NULL DEFAULT 0,
             FOREIGN KEY (username) REFERENCES users(username)
         )
     """)
 
+    # Older databases predate the version column used for optimistic updates and the stored timer end
+    for table in ('washer_assignments', 'dryer_assignments'):
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = [row[1] for row in cursor.fetchall()]
+        if 'version' not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        if 'timer_ends_at' not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN timer_ends_at REAL")
+            cursor.execute(f"UPDATE {table} SET timer_ends_at=? + timer_minutes * 60 WHERE status='In Progress' AND timer_minutes > 0",
+                           (time.time(),))
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS machine_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            machine_type TEXT NOT NULL,
+            machine_number INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            value TEXT,
+            received_at DATETIME
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            recipient TEXT NOT NULL,
+            message TEXT NOT NULL,
+            dedup_key TEXT NOT NULL UNIQUE,
+            status TEXT DEFAULT 'Pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL DEFAULT 0,
+            last_error TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            sent_at DATETIME
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+
     cursor.execute("INSERT OR IGNORE INTO users (username, email, phone, password, role) VALUES (?, ?, ?, ?, ?)",
                    ('admin', 'admin@example.com', '1234567890', 'adminpass', 'admin'))
 
@@ -95,7 +223,7 @@ def initialize_db():
 # ---------------- USER FUNCTIONS ----------------
 def register_user(username, email, phone, password):
     try:
-        conn = sqlite3.connect("laundry.db")
+        conn = connect_db()
         cursor = conn.cursor()
         cursor.execute("INSERT INTO users (username, email, phone, password, role) VALUES (?, ?, ?, ?, 'customer')",
                        (username, email, phone, password))
@@ -106,13 +234,1164 @@ def register_user(username, email, phone, password):
         return False
 
 def login_user(username, password):
-    conn = sqlite3.connect("laundry.db")
+    conn = connect_db()
     cursor = conn.cursor()
     cursor.execute("SELECT role FROM users WHERE username = ? AND password = ?", (username, password))
     result = cursor.fetchone()
     conn.close()
     return result
 
+# ---------------- OUTBOUND NOTIFICATIONS ----------------
+# Messages are queued in the outbox table inside the same transaction as the stage change,
+# then a background dispatcher sends them by email and SMS.
+SMTP_HOST = os.environ.get("LAUNDRIX_SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("LAUNDRIX_SMTP_PORT", "1025"))
+SMTP_SENDER = os.environ.get("LAUNDRIX_SMTP_SENDER", "laundrix@localhost")
+SMTP_SECURITY = os.environ.get("LAUNDRIX_SMTP_SECURITY", "")  # "", "starttls" or "ssl"
+SMTP_USER = os.environ.get("LAUNDRIX_SMTP_USER", "")
+SMTP_PASSWORD = os.environ.get("LAUNDRIX_SMTP_PASSWORD", "")
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_POLL_INTERVAL = 2      # seconds between outbox checks when idle
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_BASE = 5         # seconds before the first retry, doubled on every attempt
+OUTBOX_CLAIM_TIMEOUT = 300    # seconds before a batch claimed by a crashed dispatcher is retried
+
+STAGE_MESSAGES = {
+    'Washed': "Hi {username}, your laundry has been washed.",
+    'Dried': "Hi {username}, your laundry is dry and ready for pick up.",
+}
+
+notification_dispatcher = None
+
+def enqueue_notification(cursor, username, message, dedup_key):
+    # Queues an email and an SMS for the user; a dedup_key that was already queued is ignored
+    cursor.execute("SELECT email, phone FROM users WHERE username=?", (username,))
+    contact = cursor.fetchone()
+    if not contact:
+        return False
+
+    queued = False
+    for channel, recipient in (('email', contact[0]), ('sms', contact[1])):
+        cursor.execute("INSERT OR IGNORE INTO outbox (username, channel, recipient, message, dedup_key) VALUES (?, ?, ?, ?, ?)",
+                       (username, channel, recipient, message, f"{dedup_key}:{channel}"))
+        queued = queued or cursor.rowcount > 0
+    if queued:
+        cursor.execute("INSERT INTO notifications (username, message) VALUES (?, ?)", (username, message))
+    return queued
+
+def enqueue_stage_notification(cursor, username, stage, cycle):
+    # cycle identifies one machine run (e.g. "Washer:12:2025-05-16 05:35:22") so it is only announced once
+    enqueue_notification(cursor, username, STAGE_MESSAGES[stage].format(username=username), f"{cycle}:{stage}")
+
+class RateLimiter:
+    # Token bucket: `rate` sends per second on average, bursts of up to `burst`
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, count=1):
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= count:
+                    self.tokens -= count
+                    return
+                time.sleep((count - self.tokens) / self.rate)
+
+class SmtpPool:
+    # Keeps up to `size` SMTP connections open between batches. Each one is secured and
+    # logged in once when it is opened, if security and a username are configured.
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, size=2,
+                 security=SMTP_SECURITY, username=SMTP_USER, password=SMTP_PASSWORD):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.security = security.lower()
+        self.username = username
+        self.password = password
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def connect(self):
+        if self.security == "ssl":
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=10, context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=10)
+        try:
+            if self.security == "starttls":
+                smtp.starttls(context=ssl.create_default_context())
+            if self.username:
+                smtp.login(self.username, self.password)
+        except (OSError, smtplib.SMTPException):
+            smtp.close()
+            raise
+        return smtp
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                smtp = self.idle.pop() if self.idle else None
+            if smtp is None:
+                return self.connect()
+            try:
+                smtp.noop()  # The server may have dropped an idle connection
+                return smtp
+            except (OSError, smtplib.SMTPException):
+                smtp.close()
+
+    def release(self, smtp, broken=False):
+        if not broken:
+            with self.lock:
+                if len(self.idle) < self.size:
+                    self.idle.append(smtp)
+                    return
+        try:
+            smtp.quit()
+        except (OSError, smtplib.SMTPException):
+            smtp.close()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for smtp in idle:
+            self.release(smtp, broken=True)
+
+class SmsGateway:
+    # Subclass and implement send() to plug in a real SMS provider
+    def send(self, phone, message):
+        raise NotImplementedError
+
+    def send_batch(self, messages):
+        # messages: [(outbox id, phone, text)], returns [(outbox id, error or None)]
+        results = []
+        for outbox_id, phone, message in messages:
+            try:
+                self.send(phone, message)
+                results.append((outbox_id, None))
+            except Exception as e:
+                results.append((outbox_id, str(e) or type(e).__name__))
+        return results
+
+class FakeSmsGateway(SmsGateway):
+    # Local stand-in that keeps messages in memory instead of sending them
+    def __init__(self, fail_rate=0.0, verbose=False):
+        self.fail_rate = fail_rate
+        self.verbose = verbose
+        self.sent = []
+
+    def send(self, phone, message):
+        if random.random() < self.fail_rate:
+            raise ConnectionError("simulated gateway failure")
+        self.sent.append((phone, message))
+        if self.verbose:
+            print(f"SMS to {phone}: {message}")
+
+class NotificationDispatcher:
+    def __init__(self, db_path=DB_PATH, smtp_pool=None, sms_gateway=None,
+                 email_rate=20, sms_rate=5, batch_size=OUTBOX_BATCH_SIZE):
+        self.db_path = db_path
+        self.smtp_pool = smtp_pool or SmtpPool()
+        self.sms_gateway = sms_gateway or FakeSmsGateway()
+        self.email_limiter = RateLimiter(email_rate)
+        self.sms_limiter = RateLimiter(sms_rate)
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=self.smtp_pool.size)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def claim_batch(self, conn):
+        # Claimed rows are pushed OUTBOX_CLAIM_TIMEOUT into the future so other terminals skip them.
+        # Claiming counts as an attempt, so a message whose batch keeps crashing the dispatcher
+        # is given up on instead of being reclaimed forever.
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE outbox SET status='Failed', last_error=COALESCE(last_error, 'Dispatcher failed while sending') WHERE status='Sending' AND next_attempt_at <= ? AND attempts >= ?",
+                         (now, OUTBOX_MAX_ATTEMPTS))
+            rows = conn.execute("SELECT id, channel, recipient, message, attempts FROM outbox WHERE status IN ('Pending', 'Sending') AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                                (now, self.batch_size)).fetchall()
+            conn.executemany("UPDATE outbox SET status='Sending', attempts=attempts+1, next_attempt_at=? WHERE id=?",
+                             [(now + OUTBOX_CLAIM_TIMEOUT, row[0]) for row in rows])
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def send_email_chunk(self, rows):
+        try:
+            smtp = self.smtp_pool.acquire()
+        except (OSError, smtplib.SMTPException) as e:
+            return [(row[0], f"SMTP connect failed: {e}") for row in rows]
+
+        results = []
+        broken = False
+        for outbox_id, recipient, message in rows:
+            if broken:
+                results.append((outbox_id, "SMTP connection lost"))
+                continue
+            self.email_limiter.acquire()
+            try:
+                mail = EmailMessage()
+                mail['From'] = SMTP_SENDER
+                mail['To'] = recipient
+                mail['Subject'] = "Laundrix laundry update"
+                mail.set_content(message)
+            except ValueError as e:
+                results.append((outbox_id, f"Bad message: {e}"))  # e.g. a malformed stored address
+                continue
+            try:
+                smtp.send_message(mail)
+                results.append((outbox_id, None))
+            except smtplib.SMTPServerDisconnected as e:
+                broken = True
+                results.append((outbox_id, str(e) or "SMTP connection lost"))
+            except smtplib.SMTPException as e:
+                # Refused sender or recipient, rejected data, missing SMTPUTF8...: only this message failed
+                results.append((outbox_id, str(e) or type(e).__name__))
+            except OSError as e:
+                broken = True  # Socket error; SMTPException subclasses OSError so it is caught above
+                results.append((outbox_id, str(e)))
+        self.smtp_pool.release(smtp, broken)
+        return results
+
+    def send_sms(self, rows):
+        results = []
+        step = max(1, int(self.sms_limiter.capacity))
+        for i in range(0, len(rows), step):
+            chunk = rows[i:i + step]
+            self.sms_limiter.acquire(len(chunk))
+            results.extend(self.sms_gateway.send_batch(chunk))
+        return results
+
+    def run_once(self, conn):
+        rows = self.claim_batch(conn)
+        if not rows:
+            return 0
+        attempts = {row[0]: row[4] for row in rows}
+        emails = [(row[0], row[2], row[3]) for row in rows if row[1] == 'email']
+        sms = [(row[0], row[2], row[3]) for row in rows if row[1] == 'sms']
+
+        # Emails are spread over the pooled connections while SMS goes through the gateway
+        chunk_size = -(-len(emails) // self.smtp_pool.size) or 1
+        email_jobs = [self.executor.submit(self.send_email_chunk, emails[i:i + chunk_size])
+                      for i in range(0, len(emails), chunk_size)]
+        try:
+            results = self.send_sms(sms)
+        except Exception as e:
+            # A broken gateway must not lose the outcome of the emails sent alongside it
+            results = [(row[0], f"SMS gateway error: {e}") for row in sms]
+        for job in email_jobs:
+            results.extend(job.result())
+
+        now = time.time()
+        sent_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        sent, retry, failed = [], [], []
+        for outbox_id, error in results:
+            tries = attempts[outbox_id] + 1
+            if error is None:
+                sent.append((tries, sent_at, outbox_id))
+            elif tries >= OUTBOX_MAX_ATTEMPTS:
+                failed.append((tries, error, outbox_id))
+            else:
+                delay = OUTBOX_RETRY_BASE * 2 ** (tries - 1) * random.uniform(0.8, 1.2)
+                retry.append((tries, now + delay, error, outbox_id))
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("UPDATE outbox SET status='Sent', attempts=?, sent_at=?, last_error=NULL WHERE id=?", sent)
+            conn.executemany("UPDATE outbox SET status='Pending', attempts=?, next_attempt_at=?, last_error=? WHERE id=?", retry)
+            conn.executemany("UPDATE outbox SET status='Failed', attempts=?, last_error=? WHERE id=?", failed)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def run(self, poll_interval=OUTBOX_POLL_INTERVAL):
+        conn = connect_db(self.db_path, isolation_level=None)
+        while not self.stop_event.is_set():
+            try:
+                processed = self.run_once(conn)
+            except Exception as e:
+                # Keep the thread alive; rows claimed by the failed batch are retried after OUTBOX_CLAIM_TIMEOUT
+                print(f"Notification dispatcher: {type(e).__name__}: {e}", file=sys.stderr)
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                processed = 0
+            if processed < self.batch_size:
+                self.stop_event.wait(poll_interval)
+        conn.close()
+        self.smtp_pool.close()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+def start_notification_dispatcher():
+    global notification_dispatcher
+    if notification_dispatcher is None:
+        notification_dispatcher = NotificationDispatcher()
+        notification_dispatcher.start()
+
+class LocalSmtpServer:
+    # Minimal SMTP sink for trying the dispatcher without a real mail server
+    def __init__(self, host="127.0.0.1", port=SMTP_PORT, verbose=False):
+        self.host = host
+        self.port = port
+        self.verbose = verbose
+        self.received = 0
+
+    async def handle(self, reader, writer):
+        writer.write(b"220 laundrix debug SMTP\r\n")
+        in_data = False
+        lines = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if in_data:
+                if line.rstrip(b"\r\n") == b".":
+                    in_data = False
+                    self.received += 1
+                    if self.verbose:
+                        print(b"".join(lines).decode('utf-8', 'replace'))
+                    lines = []
+                    writer.write(b"250 OK\r\n")
+                elif self.verbose:
+                    lines.append(line)
+                continue
+            command = line[:4].upper()
+            if command == b"EHLO":
+                writer.write(b"250-laundrix\r\n250 8BITMIME\r\n")
+            elif command == b"DATA":
+                in_data = True
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+    async def serve(self, ready=None):
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def start(self):
+        ready = threading.Event()
+        threading.Thread(target=lambda: asyncio.run(self.serve(ready)), daemon=True).start()
+        ready.wait(5)
+
+def benchmark_notifications(count=5000):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        initialize_db(db_path)
+        conn = connect_db(db_path)
+        c = conn.cursor()
+        c.executemany("INSERT INTO users (username, email, phone, password) VALUES (?, ?, ?, ?)",
+                      [(f"bench{i}", f"bench{i}@example.com", f"0917{i:07d}", "x") for i in range(100)])
+        for i in range(count):
+            enqueue_notification(c, f"bench{i % 100}", "Your laundry is ready for pick up.", f"bench:{i}")
+        duplicates = sum(enqueue_notification(c, f"bench{i % 100}", "Duplicate", f"bench:{i}") for i in range(0, count, 10))
+        conn.commit()
+        conn.close()
+
+        sink = LocalSmtpServer(port=0)
+        sink.start()
+        gateway = FakeSmsGateway()
+        dispatcher = NotificationDispatcher(db_path, SmtpPool("127.0.0.1", sink.port, size=4), gateway,
+                                            email_rate=1000000, sms_rate=1000000, batch_size=500)
+        dispatch_conn = connect_db(db_path, isolation_level=None)
+        start = time.perf_counter()
+        while dispatcher.run_once(dispatch_conn):
+            pass
+        elapsed = time.perf_counter() - start
+        statuses = dict(dispatch_conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        dispatch_conn.close()
+        dispatcher.smtp_pool.close()
+
+    total = count * 2
+    print(f"Dispatched {total} messages ({sink.received} emails, {len(gateway.sent)} SMS) in {elapsed:.2f}s "
+          f"= {total / elapsed:.0f} messages/sec")
+    print(f"Outbox: {statuses}, duplicate enqueues accepted: {duplicates}")
+
+# ---------------- MACHINE TELEMETRY ----------------
+# Washers and dryers report over a local socket, one event per line:
+#   <W|D><machine number> <START|PROGRESS|FAULT|FINISH> [value]
+# e.g. "W2 START 35" (35 minute cycle), "D1 PROGRESS 12" (12 minutes left),
+# "W3 FAULT E21" (error code), "W2 FINISH".
+TELEMETRY_HOST = "127.0.0.1"
+TELEMETRY_PORT = 9750
+TELEMETRY_QUEUE_SIZE = 10000     # events buffered before socket reads are paused
+TELEMETRY_BATCH_SIZE = 500       # max events per group commit
+TELEMETRY_FLUSH_INTERVAL = 0.05  # max seconds an event waits for its commit
+
+MACHINE_CODES = {'W': 'Washer', 'D': 'Dryer'}
+TELEMETRY_EVENTS = ('START', 'PROGRESS', 'FAULT', 'FINISH')
+
+telemetry_stats = {'received': 0, 'rejected': 0, 'committed': 0, 'batches': 0}
+telemetry_thread = None
+
+def parse_telemetry_line(line):
+    parts = line.split()
+    if len(parts) not in (2, 3):
+        return None
+    machine, event = parts[0], parts[1].upper()
+    machine_type = MACHINE_CODES.get(machine[:1].upper())
+    if machine_type is None or not machine[1:].isdigit() or event not in TELEMETRY_EVENTS:
+        return None
+    value = parts[2] if len(parts) == 3 else None
+    if event in ('START', 'PROGRESS') and (value is None or not value.isdigit()):
+        return None
+    return (machine_type, int(machine[1:]), event, value)
+
+def write_telemetry_batch(conn, events):
+    received_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        apply_telemetry_events(c, events, received_at)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+def apply_telemetry_events(c, events, received_at):
+    c.executemany("INSERT INTO machine_events (machine_type, machine_number, event, value, received_at) VALUES (?, ?, ?, ?, ?)",
+                  [(machine_type, machine_number, event, value, received_at)
+                   for machine_type, machine_number, event, value in events])
+
+    # Events are applied in arrival order since a batch can hold START and FINISH for the same machine
+    now = time.time()
+    for machine_type, machine_number, event, value in events:
+        table = machine_type.lower()
+        active = f"{table}_number=? AND status IN ('In Progress', 'Fault')"
+        if event == 'START':
+            c.execute(f"UPDATE {table}_assignments SET status='In Progress', start_time=?, timer_minutes=?, timer_ends_at=?, version=version+1 WHERE {active}",
+                      (received_at, int(value), now + int(value) * 60, machine_number))
+        elif event == 'PROGRESS':
+            # Countdown ticks don't bump version: an operator's Set Timer, Done or Delete shouldn't conflict with them
+            c.execute(f"UPDATE {table}_assignments SET timer_minutes=?, timer_ends_at=? WHERE {active}",
+                      (int(value), now + int(value) * 60, machine_number))
+        elif event == 'FAULT':
+            c.execute(f"UPDATE {table}_assignments SET status='Fault', version=version+1 WHERE {active}", (machine_number,))
+        elif event == 'FINISH':
+            status = 'Washed' if machine_type == 'Washer' else 'Dried'
+            c.execute(f"UPDATE laundry_status SET status=?, updated_at=? WHERE status='Received' AND username IN (SELECT username FROM {table}_assignments WHERE {active})",
+                      (status, received_at, machine_number))
+            c.execute(f"SELECT id, username, start_time FROM {table}_assignments WHERE {active}", (machine_number,))
+            for assignment_id, username, start_time in c.fetchall():
+                enqueue_stage_notification(c, username, status, f"{machine_type}:{assignment_id}:{start_time}")
+            c.execute(f"UPDATE {table}_assignments SET status='Done', timer_minutes=0, timer_ends_at=NULL, version=version+1 WHERE {active}", (machine_number,))
+
+async def handle_telemetry_client(reader, writer, queue):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            event = parse_telemetry_line(line.decode('ascii', 'replace'))
+            if event is None:
+                telemetry_stats['rejected'] += 1
+                continue
+            telemetry_stats['received'] += 1
+            await queue.put(event)  # Waits while the queue is full, so TCP flow control slows the sender
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def commit_telemetry(queue, db_path):
+    loop = asyncio.get_running_loop()
+    # One worker thread owns the connection so commits never run on the event loop
+    executor = ThreadPoolExecutor(max_workers=1)
+    conn = await loop.run_in_executor(executor, connect_db, db_path)
+
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + TELEMETRY_FLUSH_INTERVAL
+        while len(batch) < TELEMETRY_BATCH_SIZE:
+            try:
+                batch.append(queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            await loop.run_in_executor(executor, run_with_retry, write_telemetry_batch, conn, batch)
+        except sqlite3.Error as e:
+            print(f"Telemetry: dropped batch of {len(batch)} events: {e}", file=sys.stderr)
+            continue
+        telemetry_stats['committed'] += len(batch)
+        telemetry_stats['batches'] += 1
+
+async def serve_telemetry(host=TELEMETRY_HOST, port=TELEMETRY_PORT, unix_path=None, db_path=DB_PATH):
+    queue = asyncio.Queue(maxsize=TELEMETRY_QUEUE_SIZE)
+
+    def on_connect(reader, writer):
+        return handle_telemetry_client(reader, writer, queue)
+
+    if unix_path:
+        server = await asyncio.start_unix_server(on_connect, path=unix_path)
+    else:
+        server = await asyncio.start_server(on_connect, host, port)
+
+    committer = asyncio.create_task(commit_telemetry(queue, db_path))
+    async with server:
+        await asyncio.gather(server.serve_forever(), committer)
+
+def start_telemetry_service():
+    # Runs the ingestion loop on a daemon thread so the Tk mainloop is never blocked
+    global telemetry_thread
+    if telemetry_thread is not None:
+        return
+
+    def run():
+        try:
+            asyncio.run(serve_telemetry())
+        except OSError as e:
+            print(f"Telemetry service not started: {e}", file=sys.stderr)
+
+    telemetry_thread = threading.Thread(target=run, daemon=True)
+    telemetry_thread.start()
+
+async def simulate_telemetry(host=TELEMETRY_HOST, port=TELEMETRY_PORT, rate=1000, duration=10, machines=3):
+    # Replays plausible cycles for a floor of washers and dryers at roughly `rate` events per second
+    reader, writer = await asyncio.open_connection(host, port)
+    remaining = {f"{code}{i}": 0 for code in MACHINE_CODES for i in range(1, machines + 1)}
+    names = list(remaining)
+    loop = asyncio.get_running_loop()
+    tick = 0.01
+    per_tick = max(1, int(rate * tick))
+    sent = 0
+    start = loop.time()
+
+    while loop.time() - start < duration:
+        lines = []
+        for _ in range(per_tick):
+            machine = random.choice(names)
+            if remaining[machine] == 0:
+                remaining[machine] = random.randint(25, 60)
+                lines.append(f"{machine} START {remaining[machine]}\n")
+            elif random.random() < 0.001:
+                lines.append(f"{machine} FAULT E{random.randint(10, 99)}\n")
+            elif remaining[machine] == 1:
+                remaining[machine] = 0
+                lines.append(f"{machine} FINISH\n")
+            else:
+                remaining[machine] -= 1
+                lines.append(f"{machine} PROGRESS {remaining[machine]}\n")
+        writer.write("".join(lines).encode('ascii'))
+        await writer.drain()  # Honours backpressure from the service
+        sent += len(lines)
+        await asyncio.sleep(max(0, start + sent / rate - loop.time()))
+
+    elapsed = loop.time() - start
+    writer.close()
+    await writer.wait_closed()
+    return sent, elapsed
+
+# ---------------- FLOOR STATE ----------------
+# In-memory copy of the washer/dryer assignments, shared by every queue window.
+# Windows only render it; all changes go through FloorState so the DB and memory stay in step.
+MACHINES_PER_TYPE = 3
+
+class Assignment:
+    __slots__ = ('id', 'machine_type', 'machine_number', 'username', 'start_time', 'status', 'timer_minutes', 'version', 'end_time')
+
+    def __init__(self, id, machine_type, machine_number, username, start_time, status, timer_minutes, timer_ends_at, version):
+        self.id = id
+        self.machine_type = machine_type
+        self.machine_number = machine_number
+        self.username = username
+        self.start_time = start_time
+        self.status = status or 'In Progress'
+        self.timer_minutes = timer_minutes or 0
+        self.version = version  # Row version this copy was read at, checked by every write
+        # time.time() when the running timer expires; stored in the row so every terminal counts down to the same moment
+        self.end_time = timer_ends_at if self.status == 'In Progress' else None
+
+    def remaining(self, now):
+        return max(0, self.end_time - now) if self.end_time is not None else 0
+
+    def same_as(self, other):
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+class FloorState:
+    __slots__ = ('db_path', 'conn', 'assignments', 'by_machine', 'version', 'data_version')
+
+    def __init__(self, db_path=DB_PATH, busy_timeout=DB_UI_BUSY_TIMEOUT):
+        self.db_path = db_path
+        # Also used for writes, so our own commits don't change data_version. Writes come from the Tk thread,
+        # so each attempt waits briefly and run_with_retry's jittered retries cover a lock held a little longer.
+        self.conn = connect_db(db_path, timeout=busy_timeout)
+        self.assignments = {}   # {assignment id: Assignment}
+        self.by_machine = {}    # {(machine_type, machine_number): {assignment id: Assignment}}
+        self.version = 0        # bumped on every change so windows know to re-render
+        self.data_version = None
+
+    def load(self):
+        c = self.conn.cursor()
+        # Read before loading so a commit that lands mid-load still triggers the next sync
+        data_version = c.execute("PRAGMA data_version").fetchone()[0]
+        # Built aside and swapped in at the end, so a failed read leaves the previous state intact
+        assignments = {}
+        by_machine = {}
+        changed = False
+        for machine_type in MACHINE_CODES.values():
+            table = machine_type.lower()
+            c.execute(f"SELECT id, {table}_number, username, start_time, status, timer_minutes, timer_ends_at, version FROM {table}_assignments ORDER BY id")
+            for row in c.fetchall():
+                assignment = Assignment(row[0], machine_type, *row[1:])
+                old = self.assignments.get(assignment.id)
+                # Unchanged rows keep their object, so windows holding it stay valid
+                if old is not None and old.same_as(assignment):
+                    assignment = old
+                else:
+                    changed = True
+                assignments[assignment.id] = assignment
+                by_machine.setdefault((machine_type, assignment.machine_number), {})[assignment.id] = assignment
+        self.conn.commit()  # Ends the read transaction
+        if changed or len(assignments) != len(self.assignments):
+            self.version += 1
+        self.assignments = assignments
+        self.by_machine = by_machine
+        self.data_version = data_version
+
+    def sync(self):
+        # data_version changes whenever another connection commits: telemetry, the dispatcher or another terminal.
+        # Rows that didn't change keep their Assignment, and end times come from the DB, so reloads never reset timers.
+        if self.conn.execute("PRAGMA data_version").fetchone()[0] != self.data_version:
+            self.load()
+
+    def _track(self, assignment):
+        self.assignments[assignment.id] = assignment
+        self.by_machine.setdefault((assignment.machine_type, assignment.machine_number), {})[assignment.id] = assignment
+
+    def _untrack(self, assignment):
+        del self.assignments[assignment.id]
+        key = (assignment.machine_type, assignment.machine_number)
+        rows = self.by_machine.get(key, {})
+        rows.pop(assignment.id, None)
+        if not rows:
+            self.by_machine.pop(key, None)
+        self.version += 1
+
+    def get(self, assignment_id):
+        return self.assignments.get(assignment_id)
+
+    def on_machine(self, machine_type, machine_number):
+        # The running (or faulted) assignment on the machine, else its newest one
+        rows = self.by_machine.get((machine_type, machine_number))
+        if not rows:
+            return None
+        return max(rows.values(), key=lambda a: (a.status in ('In Progress', 'Fault'), a.id))
+
+    def for_type(self, machine_type):
+        return [a for a in self.assignments.values() if a.machine_type == machine_type]
+
+    def assign(self, machine_type, username, start_time, item=None):
+        # Takes the first free machine, or hands over the machine with the oldest running assignment when all are busy.
+        # item also records the check-in in laundry_status within the same transaction.
+        table = machine_type.lower()
+
+        def attempt():
+            with write_transaction(conn=self.conn) as c:
+                if item is not None:
+                    c.execute("INSERT INTO laundry_status (username, item, status, updated_at) VALUES (?, ?, ?, ?)",
+                              (username, item, 'Received', start_time))
+
+                # Busy machines are read under the write lock, so two terminals can't pick the same one
+                c.execute(f"SELECT id, {table}_number, version FROM {table}_assignments WHERE status IN ('In Progress', 'Fault') ORDER BY start_time ASC, id ASC")
+                active = c.fetchall()
+                busy = {row[1] for row in active}
+                for i in range(1, MACHINES_PER_TYPE + 1):
+                    if i not in busy:
+                        c.execute(f"INSERT INTO {table}_assignments ({table}_number, username, start_time, status, timer_minutes) VALUES (?, ?, ?, ?, ?)",
+                                  (i, username, start_time, 'In Progress', 0))
+                        return Assignment(c.lastrowid, machine_type, i, username, start_time, 'In Progress', 0, None, 0)
+
+                assignment_id, machine_number, version = active[0]
+                c.execute(f"UPDATE {table}_assignments SET username=?, start_time=?, status='In Progress', timer_minutes=0, timer_ends_at=NULL, version=version+1 WHERE id=?",
+                          (username, start_time, assignment_id))
+                return Assignment(assignment_id, machine_type, machine_number, username, start_time, 'In Progress', 0, None, version + 1)
+
+        assignment = run_with_retry(attempt)
+        self._track(assignment)
+        self.version += 1
+        return assignment
+
+    def _write(self, assignment, statement, params=(), advance_laundry=False):
+        # Only applies the statement if the row is still at the version we loaded.
+        # On a conflict the state is reloaded before StaleAssignmentError is raised.
+        def attempt():
+            with write_transaction(conn=self.conn) as c:
+                c.execute(statement.format(table=assignment.machine_type.lower()) + " WHERE id=? AND version=?",
+                          params + (assignment.id, assignment.version))
+                if c.rowcount == 0:
+                    raise StaleAssignmentError(f"{assignment.machine_type} assignment {assignment.id} was changed elsewhere")
+                if advance_laundry:
+                    self._advance_laundry(c, assignment)
+
+        try:
+            run_with_retry(attempt)
+        except StaleAssignmentError:
+            self.load()
+            raise
+        assignment.version += 1
+
+    def set_timer(self, assignment, minutes):
+        end_time = time.time() + minutes * 60
+        self._write(assignment, "UPDATE {table}_assignments SET status='In Progress', timer_minutes=?, timer_ends_at=?, version=version+1",
+                    (minutes, end_time))
+        assignment.status = 'In Progress'
+        assignment.timer_minutes = minutes
+        assignment.end_time = end_time
+        self.version += 1
+
+    def finish(self, assignment):
+        # Timer ran out: the machine is done but the row stays on the queue
+        self._write(assignment, "UPDATE {table}_assignments SET status='Done', timer_minutes=0, timer_ends_at=NULL, version=version+1", advance_laundry=True)
+        assignment.status = 'Done'
+        assignment.timer_minutes = 0
+        assignment.end_time = None
+        self.version += 1
+
+    def mark_done(self, assignment):
+        self._write(assignment, "DELETE FROM {table}_assignments", advance_laundry=True)
+        self._untrack(assignment)
+
+    def delete(self, assignment):
+        self._write(assignment, "DELETE FROM {table}_assignments")
+        self._untrack(assignment)
+
+    def _advance_laundry(self, cursor, assignment):
+        status = 'Washed' if assignment.machine_type == 'Washer' else 'Dried'
+        cursor.execute("UPDATE laundry_status SET status=?, updated_at=? WHERE username=? AND status='Received'",
+                       (status, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), assignment.username))
+        enqueue_stage_notification(cursor, assignment.username, status,
+                                   f"{assignment.machine_type}:{assignment.id}:{assignment.start_time}")
+
+floor_state = None
+
+def get_floor_state():
+    # Loaded from the DB the first time any window needs it, then shared
+    global floor_state
+    if floor_state is None:
+        floor_state = FloorState()
+        floor_state.load()
+    return floor_state
+
+# ---------------- MULTI-TERMINAL STRESS TEST ----------------
+# Runs several processes against one database the way several counter terminals would.
+STRESS_ACTIVE = "status IN ('In Progress', 'Fault')"
+
+def stress_worker(db_path, worker_id, operations):
+    state = FloorState(db_path)
+    state.load()
+    username = f"stress{worker_id}"
+    counts = {'assigned': 0, 'released': 0, 'increments': 0, 'conflicts': 0}
+    start = time.perf_counter()
+
+    for _ in range(operations):
+        op = random.random()
+        if op < 0.4:
+            state.assign('Washer', username, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            counts['assigned'] += 1
+        elif op < 0.6:
+            state.sync()
+            running = [a for a in state.for_type('Washer') if a.status == 'In Progress']
+            if running:
+                try:
+                    state.mark_done(random.choice(running))
+                    counts['released'] += 1
+                except StaleAssignmentError:
+                    counts['conflicts'] += 1
+        else:
+            # Read-modify-write on a shared row; every success must show up in the final total
+            while True:
+                state.sync()
+                counter = state.on_machine('Dryer', 1)
+                try:
+                    state.set_timer(counter, counter.timer_minutes + 1)
+                    counts['increments'] += 1
+                    break
+                except StaleAssignmentError:
+                    counts['conflicts'] += 1
+
+    counts['seconds'] = time.perf_counter() - start
+    print(json.dumps(counts))
+
+def stress_test(processes=4, operations=300):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "stress.db")
+        initialize_db(db_path)
+        conn = connect_db(db_path)
+        c = conn.cursor()
+        c.executemany("INSERT INTO users (username, email, phone, password) VALUES (?, ?, ?, ?)",
+                      [(f"stress{i}", f"stress{i}@example.com", f"0917{i:07d}", "x") for i in range(processes)])
+        c.execute("INSERT INTO dryer_assignments (dryer_number, username, start_time, status, timer_minutes) VALUES (1, 'stress0', '', 'Done', 0)")
+        # Aborts any write that would put two running assignments on one washer, even briefly
+        c.execute(f"""
+            CREATE TRIGGER stress_insert_guard BEFORE INSERT ON washer_assignments
+            WHEN NEW.{STRESS_ACTIVE} AND EXISTS (SELECT 1 FROM washer_assignments WHERE washer_number=NEW.washer_number AND {STRESS_ACTIVE})
+            BEGIN SELECT RAISE(ABORT, 'washer double-booked'); END
+        """)
+        c.execute(f"""
+            CREATE TRIGGER stress_update_guard BEFORE UPDATE ON washer_assignments
+            WHEN NEW.{STRESS_ACTIVE} AND EXISTS (SELECT 1 FROM washer_assignments WHERE washer_number=NEW.washer_number AND id != NEW.id AND {STRESS_ACTIVE})
+            BEGIN SELECT RAISE(ABORT, 'washer double-booked'); END
+        """)
+        conn.commit()
+
+        start = time.perf_counter()
+        workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--stress-worker", db_path, str(i), str(operations)],
+                                    cwd=tmp, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                   for i in range(processes)]
+        results = []
+        failures = []
+        for worker in workers:
+            out, err = worker.communicate()
+            if worker.returncode != 0:
+                failures.append(err.strip().splitlines()[-1])
+            else:
+                results.append(json.loads(out.strip().splitlines()[-1]))
+        elapsed = time.perf_counter() - start
+
+        c.execute(f"SELECT washer_number, COUNT(*) FROM washer_assignments WHERE {STRESS_ACTIVE} GROUP BY washer_number HAVING COUNT(*) > 1")
+        double_booked = c.fetchall()
+        c.execute("SELECT timer_minutes, version FROM dryer_assignments WHERE dryer_number=1")
+        counter, version = c.fetchone()
+        conn.close()
+
+    if failures:
+        raise SystemExit("Stress workers failed:\n" + "\n".join(failures))
+    totals = {key: sum(r[key] for r in results) for key in ('assigned', 'released', 'increments', 'conflicts')}
+    print(f"{processes} processes x {operations} operations in {elapsed:.2f}s = {processes * operations / elapsed:.0f} operations/sec")
+    print(f"Assigned {totals['assigned']}, released {totals['released']}, "
+          f"{totals['increments']} counter increments, {totals['conflicts']} optimistic conflicts retried")
+    assert not double_booked, f"Double-booked washers: {double_booked}"
+    assert counter == totals['increments'] == version, f"Lost updates: counter={counter} version={version} expected={totals['increments']}"
+    print("OK: no double-booked machines and no lost updates")
+
+# ---------------- BACKUPS ----------------
+# Snapshots are taken with sqlite's online backup API while the app is running.
+# A full snapshot is a plain laundry-<time>.db file; an incremental one is a laundry-<time>.json
+# manifest whose chunks live in backups/chunks and are shared with earlier snapshots.
+BACKUP_DIR = "backups"
+BACKUP_PAGES_PER_STEP = 256     # pages copied per backup step
+BACKUP_STEP_PAUSE = 0.002       # seconds to pause between steps so check-ins get the disk
+BACKUP_CHUNK_SIZE = 1024 * 1024  # bytes per stored chunk in incremental snapshots
+BACKUP_KEEP = 24                # snapshots kept by rotation
+BACKUP_INTERVAL = 3600          # seconds between scheduled snapshots
+BACKUP_LOCK_STALE = 6 * 3600    # seconds before a backup lock or in-progress marker is treated as abandoned
+
+backup_scheduler = None
+
+def backup_database(dest_path, db_path=DB_PATH, pages=BACKUP_PAGES_PER_STEP, pause=BACKUP_STEP_PAUSE):
+    src = connect_db(db_path)
+    dst = sqlite3.connect(dest_path)
+    try:
+        # In WAL mode, holding a read transaction pins one snapshot, so commits made during the copy
+        # don't restart it and are never blocked by it. With a rollback journal (network shares)
+        # that would lock writers out for the whole copy, so each step takes its own short lock instead.
+        if src.execute("PRAGMA journal_mode").fetchone()[0] == 'wal':
+            src.execute("BEGIN")
+            src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        src.backup(dst, pages=pages, progress=lambda status, remaining, total: time.sleep(pause))
+        if src.in_transaction:
+            src.rollback()
+        dst.execute("PRAGMA journal_mode=DELETE")  # Keep the snapshot a single self-contained file
+    finally:
+        dst.close()
+        src.close()
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(BACKUP_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def check_integrity(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+    finally:
+        conn.close()
+
+def list_snapshots(backup_dir=BACKUP_DIR):
+    # Oldest first; the timestamp in the name sorts chronologically
+    if not os.path.isdir(backup_dir):
+        return []
+    return sorted(os.path.join(backup_dir, name) for name in os.listdir(backup_dir)
+                  if name.startswith("laundry-") and name.endswith((".db", ".json")))
+
+@contextmanager
+def backup_lock(backup_dir=BACKUP_DIR):
+    # Serializes snapshots and rotation across terminals that share backup_dir
+    os.makedirs(backup_dir, exist_ok=True)
+    lock_path = os.path.join(backup_dir, "backup.lock")
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > BACKUP_LOCK_STALE:
+                    os.remove(lock_path)  # Left behind by a process that crashed mid-backup
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.5)
+    try:
+        os.write(fd, str(os.getpid()).encode('ascii'))
+        os.close(fd)
+        yield
+    finally:
+        os.remove(lock_path)
+
+def take_snapshot(incremental=False, backup_dir=BACKUP_DIR, db_path=DB_PATH):
+    with backup_lock(backup_dir):
+        os.makedirs(os.path.join(backup_dir, "chunks"), exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        # Rotation keeps every chunk touched after this marker was created
+        marker_path = os.path.join(backup_dir, f"laundry-{stamp}.inprogress")
+        open(marker_path, 'w').close()
+        try:
+            return write_snapshot(incremental, backup_dir, db_path, stamp)
+        finally:
+            os.remove(marker_path)
+
+def write_snapshot(incremental, backup_dir, db_path, stamp):
+    copy_path = os.path.join(backup_dir, f"laundry-{stamp}.db")
+    backup_database(copy_path + ".partial", db_path)
+    if not check_integrity(copy_path + ".partial"):
+        os.remove(copy_path + ".partial")
+        raise sqlite3.DatabaseError("Snapshot failed integrity check")
+    checksum = file_sha256(copy_path + ".partial")
+
+    if not incremental:
+        os.replace(copy_path + ".partial", copy_path)
+        with open(copy_path + ".sha256", 'w') as f:
+            f.write(checksum)
+        return copy_path
+
+    # Only chunks that no earlier snapshot stored are written
+    chunks = []
+    with open(copy_path + ".partial", 'rb') as f:
+        for data in iter(lambda: f.read(BACKUP_CHUNK_SIZE), b''):
+            chunk_hash = hashlib.sha256(data).hexdigest()
+            chunk_path = os.path.join(backup_dir, "chunks", chunk_hash)
+            try:
+                os.utime(chunk_path)  # Reused: mark it as needed by an in-progress snapshot
+            except FileNotFoundError:
+                with open(chunk_path + ".partial", 'wb') as chunk_file:
+                    chunk_file.write(data)
+                os.replace(chunk_path + ".partial", chunk_path)
+            chunks.append(chunk_hash)
+    os.remove(copy_path + ".partial")
+
+    manifest_path = os.path.join(backup_dir, f"laundry-{stamp}.json")
+    with open(manifest_path + ".partial", 'w') as f:
+        json.dump({'sha256': checksum, 'chunks': chunks}, f)
+    os.replace(manifest_path + ".partial", manifest_path)
+    return manifest_path
+
+def materialize_snapshot(snapshot, dest_path):
+    # Writes the database file a snapshot describes to dest_path and checks it against the recorded checksum
+    # A missing sidecar, manifest entry or chunk means the snapshot can't be trusted, so it counts as damaged
+    try:
+        if snapshot.endswith(".json"):
+            with open(snapshot) as f:
+                manifest = json.load(f)
+            chunk_dir = os.path.join(os.path.dirname(snapshot), "chunks")
+            with open(dest_path, 'wb') as out:
+                for chunk_hash in manifest['chunks']:
+                    with open(os.path.join(chunk_dir, chunk_hash), 'rb') as chunk_file:
+                        out.write(chunk_file.read())
+            expected = manifest['sha256']
+        else:
+            with open(snapshot + ".sha256") as f:
+                expected = f.read().strip()
+            if os.path.abspath(snapshot) != os.path.abspath(dest_path):
+                with open(snapshot, 'rb') as src, open(dest_path, 'wb') as out:
+                    for data in iter(lambda: src.read(BACKUP_CHUNK_SIZE), b''):
+                        out.write(data)
+        return file_sha256(dest_path) == expected
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Snapshot {snapshot} is unreadable: {e}")
+        return False
+
+def verify_snapshot(snapshot):
+    if snapshot.endswith(".db"):
+        return materialize_snapshot(snapshot, snapshot) and check_integrity(snapshot)
+    with tempfile.TemporaryDirectory() as tmp:
+        copy_path = os.path.join(tmp, "verify.db")
+        return materialize_snapshot(snapshot, copy_path) and check_integrity(copy_path)
+
+def restore_snapshot(snapshot, db_path=DB_PATH):
+    # Copies back through the backup API so connections that are still open see a consistent database
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(db_path))) as tmp:
+        copy_path = os.path.join(tmp, "restore.db")
+        if not materialize_snapshot(snapshot, copy_path) or not check_integrity(copy_path):
+            raise sqlite3.DatabaseError(f"Snapshot {snapshot} is damaged, not restoring")
+        src = sqlite3.connect(copy_path)
+        dst = connect_db(db_path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+
+def rotate_snapshots(backup_dir=BACKUP_DIR, keep=BACKUP_KEEP):
+    with backup_lock(backup_dir):
+        snapshots = list_snapshots(backup_dir)
+        for snapshot in snapshots[:-keep] if keep else snapshots:
+            os.remove(snapshot)
+            if os.path.exists(snapshot + ".sha256"):
+                os.remove(snapshot + ".sha256")
+
+        # Snapshots still being written (only possible if a stale lock was broken) may rely on chunks
+        # that no manifest lists yet, so anything touched since the oldest one started is kept
+        now = time.time()
+        cutoff = None
+        for name in os.listdir(backup_dir):
+            if name.endswith(".inprogress"):
+                marker_path = os.path.join(backup_dir, name)
+                started = os.path.getmtime(marker_path)
+                if now - started > BACKUP_LOCK_STALE:
+                    os.remove(marker_path)  # Left behind by a crashed snapshot
+                elif cutoff is None or started < cutoff:
+                    cutoff = started
+
+        # Drop chunks that no remaining manifest refers to
+        referenced = set()
+        for snapshot in list_snapshots(backup_dir):
+            if snapshot.endswith(".json"):
+                with open(snapshot) as f:
+                    text = f.read()
+                try:
+                    referenced.update(json.loads(text)['chunks'])
+                except (ValueError, KeyError, TypeError) as e:
+                    # A damaged manifest stays for inspection, along with every chunk it still names
+                    print(f"Skipping unreadable manifest {snapshot}: {e}", file=sys.stderr)
+                    referenced.update(re.findall(r'[0-9a-f]{64}', text))
+        chunk_dir = os.path.join(backup_dir, "chunks")
+        if os.path.isdir(chunk_dir):
+            for name in os.listdir(chunk_dir):
+                chunk_path = os.path.join(chunk_dir, name)
+                if name in referenced or name.endswith(".partial"):
+                    continue
+                if cutoff is not None and os.path.getmtime(chunk_path) >= cutoff:
+                    continue
+                os.remove(chunk_path)
+
+class BackupScheduler:
+    def __init__(self, interval=BACKUP_INTERVAL, keep=BACKUP_KEEP, backup_dir=BACKUP_DIR, db_path=DB_PATH):
+        self.interval = interval
+        self.keep = keep
+        self.backup_dir = backup_dir
+        self.db_path = db_path
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                take_snapshot(incremental=True, backup_dir=self.backup_dir, db_path=self.db_path)
+                rotate_snapshots(self.backup_dir, self.keep)
+            except Exception as e:
+                # Keep the thread alive so later snapshots and rotations still run
+                print(f"Scheduled backup failed: {type(e).__name__}: {e}", file=sys.stderr)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+def start_backup_scheduler():
+    global backup_scheduler
+    if backup_scheduler is None:
+        backup_scheduler = BackupScheduler()
+        backup_scheduler.start()
+
+def latency_summary(samples):
+    samples = sorted(samples)
+    return (f"p50 {samples[len(samples) // 2] * 1000:.1f}ms, p95 {samples[int(len(samples) * 0.95)] * 1000:.1f}ms, "
+            f"max {samples[-1] * 1000:.1f}ms over {len(samples)} check-ins")
+
+def benchmark_backup(size_mb=256):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        initialize_db(db_path)
+        conn = connect_db(db_path)
+        conn.execute("INSERT INTO users (username, email, phone, password) VALUES ('bench', 'bench@example.com', '09170000000', 'x')")
+        # Filler rows stand in for years of history
+        conn.execute("CREATE TABLE bench_filler (data BLOB)")
+        conn.execute("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?) INSERT INTO bench_filler SELECT randomblob(65536) FROM n",
+                     (size_mb * 16,))
+        conn.commit()
+        conn.close()
+        state = FloorState(db_path)
+        state.load()
+
+        def check_in():
+            start = time.perf_counter()
+            state.assign('Washer', 'bench', datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), item="bench load")
+            return time.perf_counter() - start
+
+        idle = [check_in() for _ in range(200)]
+
+        backup_dir = os.path.join(tmp, "backups")
+        backup_done = threading.Event()
+        backup_time = []
+
+        def run_backup():
+            start = time.perf_counter()
+            take_snapshot(backup_dir=backup_dir, db_path=db_path)
+            backup_time.append(time.perf_counter() - start)
+            backup_done.set()
+
+        threading.Thread(target=run_backup).start()
+        during = []
+        while not backup_done.is_set():
+            during.append(check_in())
+        snapshot = list_snapshots(backup_dir)[-1]
+        verified = verify_snapshot(snapshot)
+
+    print(f"Database: {size_mb} MB, backup took {backup_time[0]:.2f}s ({size_mb / backup_time[0]:.0f} MB/s), snapshot verified: {verified}")
+    print(f"Check-in latency idle:          {latency_summary(idle)}")
+    print(f"Check-in latency during backup: {latency_summary(during)}")
+
 # ---------------- CUSTOMER DASHBOARD ----------------
 def open_dashboard(username):
     dash = tk.Tk()
@@ -135,7 +1414,7 @@ def open_dashboard(username):
         def save_appointment():
             service = service_entry.get()
             date = date_entry.get()
-            conn = sqlite3.connect("laundry.db")
+            conn = connect_db()
             c = conn.cursor()
             c.execute("INSERT INTO appointments (username, service, date) VALUES (?, ?, ?)",
                       (username, service, date))
@@ -149,7 +1428,7 @@ def open_dashboard(username):
     def view_status():
         top = tk.Toplevel(dash)
         top.title("Laundry Status")
-        conn = sqlite3.connect("laundry.db")
+        conn = connect_db()
         c = conn.cursor()
         c.execute("SELECT item, status, updated_at FROM laundry_status WHERE username=?", (username,))
         records = c.fetchall()
@@ -163,7 +1442,7 @@ def open_dashboard(username):
     def track_history():
         top = tk.Toplevel(dash)
         top.title("Item History")
-        conn = sqlite3.connect("laundry.db")
+        conn = connect_db()
         c = conn.cursor()
         c.execute("SELECT item, status, updated_at FROM laundry_status WHERE username=?", (username,))
         records = c.fetchall()
@@ -177,7 +1456,7 @@ def open_dashboard(username):
     def view_notifications():
         top = tk.Toplevel(dash)
         top.title("Notifications")
-        conn = sqlite3.connect("laundry.db")
+        conn = connect_db()
         c = conn.cursor()
         c.execute("SELECT message FROM notifications WHERE username=? AND seen=0", (username,))
         notes = c.fetchall()
@@ -214,11 +1493,15 @@ def open_admin_dashboard(username):
 
     tk.Label(dash, text=f"🧺 Welcome Admin: {username}", font=("Arial", 20, "bold"), bg="lightblue").pack(pady=10)
 
+    start_telemetry_service()
+    start_notification_dispatcher()
+    start_backup_scheduler()
+
     def dashboard_overview():
         top = tk.Toplevel(dash)
         top.title("Dashboard Overview")
 
-        conn = sqlite3.connect("laundry.db")
+        conn = connect_db()
         c = conn.cursor()
         c.execute("SELECT COUNT(*) FROM users WHERE role='customer'")
         users = c.fetchone()[0]
@@ -247,10 +1530,9 @@ def open_admin_dashboard(username):
         def checkin():
             username = user_entry.get()
             item = item_entry.get()
-            status = "Received"
             updated_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-            conn = sqlite3.connect("laundry.db")
+            conn = connect_db()
             c = conn.cursor()
             
             c.execute("SELECT id FROM users WHERE username=?", (username,))
@@ -258,27 +1540,13 @@ def open_admin_dashboard(username):
                 messagebox.showerror("Error", "User not found.")
                 conn.close()
                 return
-
-            c.execute("INSERT INTO laundry_status (username, item, status, updated_at) VALUES (?, ?, ?, ?)",
-                      (username, item, status, updated_at))
-            
-            c.execute("SELECT washer_number FROM washer_assignments WHERE status='In Progress'")
-            used_washers = [row[0] for row in c.fetchall()]
-            
-            for i in range(1, 4):
-                if i not in used_washers:
-                    c.execute("INSERT INTO washer_assignments (washer_number, username, start_time, status, timer_minutes) VALUES (?, ?, ?, ?, ?)",
-                             (i, username, updated_at, 'In Progress', 0))
-                    break
-            else:
-                c.execute("SELECT washer_number FROM washer_assignments ORDER BY start_time ASC LIMIT 1")
-                oldest_washer = c.fetchone()
-                if oldest_washer:
-                    c.execute("UPDATE washer_assignments SET username=?, start_time=?, status='In Progress', timer_minutes=0 WHERE washer_number=?",
-                             (username, updated_at, oldest_washer[0]))
-
-            conn.commit()
             conn.close()
+
+            try:
+                get_floor_state().assign('Washer', username, updated_at, item=item)
+            except sqlite3.OperationalError as e:
+                messagebox.showerror("Database Error", f"Could not check in laundry: {e}")
+                return
             messagebox.showinfo("Success", "Laundry item checked in and assigned to washer.")
             top.destroy()
 
@@ -311,76 +1579,87 @@ def open_admin_dashboard(username):
                  background=[('selected', '#e1f5fe')],
                  foreground=[('selected', 'black')])
 
-        timers = {}  # Store timer end times: {machine_number: {'end_time': float, 'username': str}}
+        tree.tag_configure('In Progress', foreground='orange')
+        tree.tag_configure('Done', foreground='green')
+        tree.tag_configure('Fault', foreground='red')
+
+        state = get_floor_state()
+        rendered_version = [None]  # FloorState.version last drawn into the tree
+
+        def timer_display(assignment, now):
+            if assignment.end_time is None:
+                return "00:00"
+            remaining = assignment.remaining(now)
+            return f"{int(remaining // 60):02d}:{int(remaining % 60):02d}"
+
+        def render():
+            # Rows are keyed by assignment id, so the tree never has to be read back
+            selected = tree.selection()
+            tree.delete(*tree.get_children())
+            now = time.time()
+            for assignment in state.for_type(machine_type):
+                tree.insert('', tk.END, iid=str(assignment.id),
+                           values=(assignment.machine_number, assignment.username, assignment.start_time,
+                                   assignment.status, timer_display(assignment, now)),
+                           tags=(assignment.status,))
+            tree.selection_set([iid for iid in selected if tree.exists(iid)])
+            rendered_version[0] = state.version
 
         def update_timers():
             try:
-                current_time = time.time()
-                for machine_number, data in list(timers.items()):
-                    remaining = max(0, data['end_time'] - current_time)
-                    mins = int(remaining // 60)
-                    secs = int(remaining % 60)
-                    timer_display = f"{mins:02d}:{secs:02d}"
-                    
-                    for item in tree.get_children():
-                        if tree.item(item)['values'][0] == machine_number:
-                            try:
-                                current_values = list(tree.item(item)['values'])
-                                current_values[4] = timer_display  # Update Timer column
-                                tree.item(item, values=current_values)
-                            except tk.TclError:
-                                return  # Window closed
-
-                    if remaining <= 0:
-                        del timers[machine_number]
-                        conn = sqlite3.connect("laundry.db")
-                        c = conn.cursor()
-                        c.execute(f"UPDATE {machine_type.lower()}_assignments SET status='Done', timer_minutes=0 WHERE {machine_type.lower()}_number=?", (machine_number,))
-                        status = 'Washed' if machine_type == 'Washer' else 'Dried'
-                        c.execute("UPDATE laundry_status SET status=?, updated_at=? WHERE username=? AND status='Received'",
-                                 (status, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), data['username']))
-                        conn.commit()
-                        conn.close()
-                        refresh_tree()
-
-                tree.update()  # Force Treeview refresh
-                top.update()   # Force window refresh
+                try:
+                    state.sync()
+                except sqlite3.OperationalError:
+                    pass  # Database busy or share unreachable: keep the last loaded state and retry on the next tick
+                now = time.time()
+                for assignment in state.for_type(machine_type):
+                    if assignment.end_time is not None and assignment.remaining(now) <= 0:
+                        try:
+                            state.finish(assignment)
+                        except StaleAssignmentError:
+                            pass  # Finished or changed on another terminal; the state was reloaded
+                        except sqlite3.OperationalError:
+                            break  # Database busy, try again on the next tick
+
+                if rendered_version[0] != state.version:
+                    render()
+                else:
+                    for assignment in state.for_type(machine_type):
+                        if assignment.end_time is not None:
+                            tree.set(str(assignment.id), 'Timer', timer_display(assignment, now))
+
                 top.after(1000, update_timers)
             except tk.TclError:
                 pass  # Window closed
 
         def refresh_tree():
-            for item in tree.get_children():
-                tree.delete(item)
-            
-            conn = sqlite3.connect("laundry.db")
-            c = conn.cursor()
             try:
-                c.execute(f"SELECT {machine_type.lower()}_number, username, start_time, status, timer_minutes FROM {machine_type.lower()}_assignments")
-                assignments = c.fetchall()
+                state.load()
             except sqlite3.OperationalError as e:
                 messagebox.showerror("Database Error", f"Error accessing {machine_type} assignments: {e}")
-                conn.close()
                 return
-            conn.close()
+            render()
 
-            timers.clear()  # Reset timers on refresh
-            for machine_number, username, start_time, status, timer_minutes in assignments:
-                timer_display = "00:00"
-                if status == 'In Progress' and timer_minutes > 0:
-                    timers[machine_number] = {
-                        'end_time': time.time() + timer_minutes * 60,
-                        'username': username
-                    }
-                    timer_display = f"{timer_minutes:02d}:00"
-                tree.insert('', tk.END, values=(machine_number, username, start_time, status or 'In Progress', timer_display),
-                           tags=(status or 'In Progress',))
-            
-            tree.tag_configure('In Progress', foreground='orange')
-            tree.tag_configure('Done', foreground='green')
-            tree.update()  # Force Treeview refresh
+        def apply(change, *args):
+            # Runs a FloorState change, reporting conflicts with other terminals instead of failing
+            try:
+                change(*args)
+                return True
+            except StaleAssignmentError:
+                render()
+                messagebox.showwarning("Warning", f"This {machine_type.lower()} assignment was changed on another terminal. Please check it and try again.")
+            except sqlite3.OperationalError as e:
+                messagebox.showerror("Database Error", f"Could not save {machine_type} assignment: {e}")
+            return False
+
+        def selected_assignment():
+            selected = tree.selection()
+            if not selected:
+                messagebox.showwarning("Warning", f"Please select a {machine_type.lower()} assignment.")
+                return None
+            return state.get(int(selected[0]))
 
-        refresh_tree()
+        render()
         top.after(1000, update_timers)  # Start timer updates
 
         button_frame = tk.Frame(top)
@@ -398,7 +1677,7 @@ def open_admin_dashboard(username):
                 username = user_entry.get()
                 updated_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 
-                conn = sqlite3.connect("laundry.db")
+                conn = connect_db()
                 c = conn.cursor()
                 
                 c.execute("SELECT id FROM users WHERE username=?", (username,))
@@ -406,52 +1685,28 @@ def open_admin_dashboard(username):
                     messagebox.showerror("Error", "User not found.")
                     conn.close()
                     return
-
-                c.execute(f"SELECT {machine_type.lower()}_number FROM {machine_type.lower()}_assignments WHERE status='In Progress'")
-                used_machines = [row[0] for row in c.fetchall()]
-                
-                for i in range(1, 4):
-                    if i not in used_machines:
-                        c.execute(f"INSERT INTO {machine_type.lower()}_assignments ({machine_type.lower()}_number, username, start_time, status, timer_minutes) VALUES (?, ?, ?, ?, ?)",
-                                 (i, username, updated_at, 'In Progress', 0))
-                        break
-                else:
-                    c.execute(f"SELECT {machine_type.lower()}_number FROM {machine_type.lower()}_assignments ORDER BY start_time ASC LIMIT 1")
-                    oldest_machine = c.fetchone()
-                    if oldest_machine:
-                        c.execute(f"UPDATE {machine_type.lower()}_assignments SET username=?, start_time=?, status='In Progress', timer_minutes=0 WHERE {machine_type.lower()}_number=?",
-                                 (username, updated_at, oldest_machine[0]))
-                
-                conn.commit()
                 conn.close()
-                refresh_tree()
+
+                if not apply(state.assign, machine_type, username, updated_at):
+                    return
+                render()
                 add_win.destroy()
 
             tk.Button(add_win, text="Submit", command=submit_add).pack(pady=10)
 
         def delete_assignment():
-            selected = tree.selection()
-            if not selected:
-                messagebox.showwarning("Warning", f"Please select a {machine_type.lower()} assignment.")
+            assignment = selected_assignment()
+            if assignment is None:
                 return
-            
-            machine_number = tree.item(selected[0])['values'][0]
-            if machine_number in timers:
-                del timers[machine_number]
-            
-            conn = sqlite3.connect("laundry.db")
-            c = conn.cursor()
-            c.execute(f"DELETE FROM {machine_type.lower()}_assignments WHERE {machine_type.lower()}_number=?", (machine_number,))
-            conn.commit()
-            conn.close()
-            
-            refresh_tree()
+
+            if not apply(state.delete, assignment):
+                return
+            render()
             messagebox.showinfo("Success", f"{machine_type} assignment removed.")
 
         def set_timer():
-            selected = tree.selection()
-            if not selected:
-                messagebox.showwarning("Warning", f"Please select a {machine_type.lower()} assignment.")
+            assignment = selected_assignment()
+            if assignment is None:
                 return
             
             timer_win = tk.Toplevel(top)
@@ -470,48 +1725,26 @@ def open_admin_dashboard(username):
                     messagebox.showerror("Error", "Please enter a valid number of minutes.")
                     return
                 
-                machine_number = tree.item(selected[0])['values'][0]
-                username = tree.item(selected[0])['values'][1]
-                
-                timers[machine_number] = {
-                    'end_time': time.time() + minutes * 60,
-                    'username': username
-                }
-                
-                conn = sqlite3.connect("laundry.db")
-                c = conn.cursor()
-                c.execute(f"UPDATE {machine_type.lower()}_assignments SET status='In Progress', timer_minutes=? WHERE {machine_type.lower()}_number=?",
-                         (minutes, machine_number))
-                conn.commit()
-                conn.close()
-                
-                refresh_tree()  # Force immediate refresh
+                current = state.get(assignment.id)  # May have been reloaded since the window opened
+                if current is None:
+                    messagebox.showerror("Error", f"This {machine_type.lower()} assignment no longer exists.")
+                    timer_win.destroy()
+                    return
+
+                if apply(state.set_timer, current, minutes):
+                    render()  # Force immediate refresh
                 timer_win.destroy()
 
             tk.Button(timer_win, text="Set Timer", command=submit_timer).pack(pady=10)
 
         def mark_done():
-            selected = tree.selection()
-            if not selected:
-                messagebox.showwarning("Warning", f"Please select a {machine_type.lower()} assignment.")
+            assignment = selected_assignment()
+            if assignment is None:
                 return
-            
-            machine_number = tree.item(selected[0])['values'][0]
-            username = tree.item(selected[0])['values'][1]
-            
-            if machine_number in timers:
-                del timers[machine_number]
-            
-            conn = sqlite3.connect("laundry.db")
-            c = conn.cursor()
-            c.execute(f"DELETE FROM {machine_type.lower()}_assignments WHERE {machine_type.lower()}_number=?", (machine_number,))
-            status = 'Washed' if machine_type == 'Washer' else 'Dried'
-            c.execute("UPDATE laundry_status SET status=?, updated_at=? WHERE username=? AND status='Received'",
-                     (status, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), username))
-            conn.commit()
-            conn.close()
-            
-            refresh_tree()
+
+            if not apply(state.mark_done, assignment):
+                return
+            render()
             messagebox.showinfo("Success", f"{machine_type} marked as done and removed from queue.")
 
         tk.Button(button_frame, text="Add", command=add_assignment, bg="#00bfff").pack(side=tk.LEFT, padx=5)
@@ -524,7 +1757,7 @@ def open_admin_dashboard(username):
         top = tk.Toplevel(dash)
         top.title("Generate Reports")
 
-        conn = sqlite3.connect("laundry.db")
+        conn = connect_db()
         c = conn.cursor()
         c.execute("SELECT COUNT(*) FROM appointments")
         total_appointments = c.fetchone()[0]
@@ -561,7 +1794,7 @@ def open_admin_dashboard(username):
             email = email_entry.get()
             phone = phone_entry.get()
 
-            conn = sqlite3.connect("laundry.db")
+            conn = connect_db()
             c = conn.cursor()
             c.execute("SELECT * FROM users WHERE username=?", (uname,))
             existing = c.fetchone()
@@ -586,7 +1819,7 @@ def open_admin_dashboard(username):
         top.title("Appointments")
         tk.Label(top, text="Appointments").pack(pady=5)
 
-        conn = sqlite3.connect("laundry.db")
+        conn = connect_db()
         c = conn.cursor()
         if user == "all":
             c.execute("SELECT username, service, date, status FROM appointments")
@@ -606,7 +1839,7 @@ def open_admin_dashboard(username):
         top.title("Laundry Records")
         tk.Label(top, text="Laundry Records").pack(pady=5)
 
-        conn = sqlite3.connect("laundry.db")
+        conn = connect_db()
         c = conn.cursor()
         if user == "all":
             c.execute("SELECT username, item, status, updated_at FROM laundry_status")
@@ -635,7 +1868,7 @@ def open_admin_dashboard(username):
         def send():
             to_user = to_entry.get()
             msg = msg_entry.get()
-            conn = sqlite3.connect("laundry.db")
+            conn = connect_db()
             c = conn.cursor()
             c.execute("INSERT INTO notifications (username, message) VALUES (?, ?)", (to_user, msg))
             conn.commit()
@@ -667,6 +1900,80 @@ def open_admin_dashboard(username):
 
     dash.mainloop()
 
+# ---------------- COMMAND LINE ----------------
+def run_command_line(args):
+    command = args[0]
+    if command == "--telemetry-server":
+        # Headless ingestion service: python laundry_system.py --telemetry-server [port]
+        port = int(args[1]) if len(args) > 1 else TELEMETRY_PORT
+
+        async def serve_with_stats():
+            service = asyncio.create_task(serve_telemetry(port=port))
+            while not service.done():
+                await asyncio.sleep(5)
+                print(f"received={telemetry_stats['received']} rejected={telemetry_stats['rejected']} "
+                      f"committed={telemetry_stats['committed']} batches={telemetry_stats['batches']}")
+            await service
+
+        print(f"Listening for machine telemetry on {TELEMETRY_HOST}:{port}")
+        asyncio.run(serve_with_stats())
+    elif command == "--telemetry-sim":
+        # python laundry_system.py --telemetry-sim [events/sec] [seconds] [machines per type] [port]
+        rate = int(args[1]) if len(args) > 1 else 1000
+        duration = float(args[2]) if len(args) > 2 else 10
+        machines = int(args[3]) if len(args) > 3 else 3
+        port = int(args[4]) if len(args) > 4 else TELEMETRY_PORT
+        sent, elapsed = asyncio.run(simulate_telemetry(port=port, rate=rate, duration=duration, machines=machines))
+        print(f"Sent {sent} events in {elapsed:.1f}s ({sent / elapsed:.0f} events/sec)")
+    elif command == "--smtp-debug-server":
+        # Prints every email the dispatcher sends: python laundry_system.py --smtp-debug-server [port]
+        server = LocalSmtpServer(port=int(args[1]) if len(args) > 1 else SMTP_PORT, verbose=True)
+        print(f"SMTP debug server listening on {server.host}:{server.port}")
+        asyncio.run(server.serve())
+    elif command == "--bench-notifications":
+        benchmark_notifications(int(args[1]) if len(args) > 1 else 5000)
+    elif command == "--stress-test":
+        # python laundry_system.py --stress-test [processes] [operations per process]
+        stress_test(int(args[1]) if len(args) > 1 else 4, int(args[2]) if len(args) > 2 else 300)
+    elif command == "--stress-worker":
+        stress_worker(args[1], int(args[2]), int(args[3]))
+    elif command == "--backup":
+        # python laundry_system.py --backup [full]
+        start = time.perf_counter()
+        snapshot = take_snapshot(incremental=not (len(args) > 1 and args[1] == "full"))
+        rotate_snapshots()
+        print(f"Snapshot {snapshot} written in {time.perf_counter() - start:.2f}s")
+    elif command == "--list-backups":
+        for snapshot in list_snapshots():
+            print(snapshot)
+    elif command == "--verify-backup":
+        snapshots = args[1:] or list_snapshots()
+        if not snapshots:
+            print(f"No snapshots found in {BACKUP_DIR}/")
+        for snapshot in snapshots:
+            print(f"{snapshot}: {'OK' if verify_snapshot(snapshot) else 'DAMAGED'}")
+    elif command == "--restore":
+        # python laundry_system.py --restore [snapshot], defaults to the newest one
+        snapshots = list_snapshots()
+        if len(args) < 2 and not snapshots:
+            raise SystemExit(f"No snapshots found in {BACKUP_DIR}/, nothing to restore")
+        snapshot = args[1] if len(args) > 1 else snapshots[-1]
+        if not os.path.exists(snapshot):
+            raise SystemExit(f"Snapshot {snapshot} does not exist")
+        start = time.perf_counter()
+        try:
+            restore_snapshot(snapshot)
+        except (OSError, sqlite3.Error) as e:
+            raise SystemExit(f"Restore failed: {e}")
+        print(f"Restored {snapshot} in {time.perf_counter() - start:.2f}s")
+    elif command == "--bench-backup":
+        benchmark_backup(int(args[1]) if len(args) > 1 else 256)
+    else:
+        print(f"Unknown option: {command}")
+        print("Options: --telemetry-server [port], --telemetry-sim [events/sec] [seconds] [machines] [port], "
+              "--smtp-debug-server [port], --bench-notifications [count], --stress-test [processes] [operations], "
+              "--backup [full], --list-backups, --verify-backup [snapshot...], --restore [snapshot], --bench-backup [size in MB]")
+
 # ---------------- GUI SETUP ----------------
 def show_frame(frame):
     frame.tkraise()
@@ -677,6 +1984,10 @@ def clear_entries(entries):
 
 initialize_db()
 
+if len(sys.argv) > 1:
+    run_command_line(sys.argv[1:])
+    sys.exit()
+
 root = tk.Tk()
 root.title("Laundrix Login/Register")
 root.geometry("400x500")